@@ -18,13 +18,21 @@ Author: Logan Garcia
 License: MIT
 """
 
+import math
 import os
-import json
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import List, Dict, Optional, Tuple
-import requests
-import pytz
+from itertools import chain
+from typing import TYPE_CHECKING, List, Dict, Optional, Tuple
+from zoneinfo import ZoneInfo
+import orjson
+
+# requests/urllib3 take most of the module's import time, and off-hours runs
+# exit before making any HTTP call - they're imported where first needed
+if TYPE_CHECKING:
+    import requests
 
 
 # Configuration from environment variables
@@ -32,6 +40,8 @@ TWELVE_DATA_API_KEY = os.getenv("TWELVE_DATA_API_KEY", "")
 FMP_API_KEY = os.getenv("FMP_API_KEY", "")
 DISCORD_BOT_TOKEN = os.getenv("DISCORD_BOT_TOKEN", "")
 DISCORD_CHANNEL_ID = os.getenv("DISCORD_CHANNEL_ID", "")
+# Optional: post through a channel webhook instead of the bot API
+DISCORD_WEBHOOK_URL = os.getenv("DISCORD_WEBHOOK_URL", "").strip()
 GIST_ID = os.getenv("GIST_ID", "")
 GH_PAT = os.getenv("GH_PAT", "")
 # Handle optional env vars - use defaults if empty or missing
@@ -39,11 +49,151 @@ _alert_threshold = os.getenv("ALERT_THRESHOLD_PCT", "90").strip()
 _haircut_rate = os.getenv("HAIRCUT_RATE", "0.125").strip()
 ALERT_THRESHOLD_PCT = float(_alert_threshold) if _alert_threshold else 90.0
 HAIRCUT_RATE = float(_haircut_rate) if _haircut_rate else 0.125
+# last_price >= previous_close * THRESHOLD_MULT  <=>  gain >= ALERT_THRESHOLD_PCT
+THRESHOLD_MULT = 1.0 + ALERT_THRESHOLD_PCT / 100.0
+# Concurrent FMP analyst-target lookups (quotes are fetched in batches)
+_max_workers = os.getenv("MAX_WORKERS", "8").strip()
+MAX_WORKERS = int(_max_workers) if _max_workers else 8
+# Analyst targets move on a days-to-weeks scale, so cache them for a day (0 disables)
+_fmp_cache_ttl = os.getenv("FMP_CACHE_TTL", "86400").strip()
+FMP_CACHE_TTL = float(_fmp_cache_ttl) if _fmp_cache_ttl else 86400.0
+# Quotes go stale fast, so caching is off by default (0); a TTL only helps runs
+# spaced closer together than it (the scheduled workflow runs every 5 minutes)
+_quote_cache_ttl = os.getenv("QUOTE_CACHE_TTL", "0").strip()
+QUOTE_CACHE_TTL = float(_quote_cache_ttl) if _quote_cache_ttl else 0.0
+# Penny stocks rarely have analyst coverage, so don't spend FMP calls on them
+_min_coverage_price = os.getenv("MIN_COVERAGE_PRICE", "1.0").strip()
+MIN_COVERAGE_PRICE = float(_min_coverage_price) if _min_coverage_price else 1.0
+# The fallback mega-cap list practically never moves 90% in a day, so only
+# quote it when explicitly asked to
+CHECK_FALLBACK_LIST = os.getenv("CHECK_FALLBACK_LIST", "").strip().lower() in ("1", "true", "yes")
 
 # Constants
-PT_TIMEZONE = pytz.timezone("America/Los_Angeles")
+PT_TIMEZONE = ZoneInfo("America/Los_Angeles")
 MARKET_OPEN_HOUR = 10
 MARKET_CLOSE_HOUR = 15
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+GIST_CACHE_TTL = 7 * 86400  # Cached Gist state is revalidated by ETag, so it can live long
+EMPTY_TARGETS_TTL = 6 * 3600  # Recheck symbols with no analyst coverage every 6 hours
+DISCORD_MESSAGE_LIMIT = 2000  # Max characters in a Discord message
+QUOTE_BATCH_SIZE = 120  # Twelve Data allows up to 120 symbols per batch request
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+# Shared urllib3 Retry options for the data/Discord APIs: back off 0.5s, 1s,
+# 2s on rate limits and transient server errors, honouring Retry-After. Only
+# idempotent methods are retried on status; POSTs only retry failed connections.
+API_RETRY = {
+    "total": 3,
+    "backoff_factor": 0.5,
+    "status_forcelist": RETRY_STATUS_CODES,
+    "respect_retry_after_header": True
+}
+# Errors an API call is expected to fail with: requests.RequestException
+# derives from OSError, and malformed JSON raises ValueError
+HTTP_ERRORS = (OSError, ValueError)
+
+# Popular/active stocks that are commonly traded
+# This is a fallback when market movers endpoint requires paid plan
+_POPULAR_STOCKS: Tuple[str, ...] = (
+    "AAPL", "MSFT", "GOOGL", "AMZN", "NVDA", "META", "TSLA", "BRK.B",
+    "V", "JNJ", "WMT", "JPM", "MA", "PG", "UNH", "HD", "DIS",
+    "BAC", "ADBE", "NFLX", "NKE", "CMCSA", "PFE", "T", "INTC", "CSCO",
+    "XOM", "CVX", "ABBV", "COST", "AVGO", "MRK", "PEP", "TMO", "ACN",
+    "ABT", "DHR", "VZ", "ADP", "WFC", "LIN", "BMY", "PM", "NEE",
+    "RTX", "TXN", "HON", "QCOM", "AMGN", "SPGI", "LOW"
+)
+
+
+def _to_float(value) -> Optional[float]:
+    """Convert an API value (number or numeric string) to float, or None if it isn't one."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def create_session(retry: Dict, pool_maxsize: int = MAX_WORKERS) -> "requests.Session":
+    """
+    Create a keep-alive HTTP session with connection pooling and retries.
+    
+    Reusing one session per API host avoids a TCP + TLS handshake on every
+    request. The pool is sized to the worker count so concurrent requests
+    from the thread pool don't discard connections.
+    
+    Args:
+        retry: urllib3 Retry options applied to every request on the session
+        pool_maxsize: Maximum number of pooled connections per host
+    
+    Returns:
+        Configured requests.Session
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(max_retries=Retry(**retry), pool_maxsize=pool_maxsize))
+    return session
+
+
+class FileCache:
+    """
+    JSON file cache with a time-to-live, used to carry API results across runs.
+    
+    Each key is stored as ``{directory}/{key}.json`` holding
+    ``{"ts": epoch_seconds, "data": ...}``; entries older than the TTL read as
+    missing. Read and write errors are treated as cache misses, so a broken
+    cache never fails a run.
+    
+    Attributes:
+        directory (str): Directory holding the cache files
+        ttl (float): Entry lifetime in seconds
+    
+    Example:
+        >>> cache = FileCache(".cache/fmp", ttl=86400)
+        >>> cache.set("AAPL_targets", [180.0, 200.0, 210.0])
+        >>> cache.get("AAPL_targets")
+        [180.0, 200.0, 210.0]
+    """
+    
+    def __init__(self, directory: str, ttl: float):
+        self.directory = directory
+        self.ttl = ttl
+    
+    def get(self, key: str, ttl: Optional[float] = None):
+        """Return cached data for key, or None if missing or older than ttl (default: self.ttl)."""
+        if ttl is None:
+            ttl = self.ttl
+        try:
+            with open(self._path(key), "rb") as f:
+                entry = orjson.loads(f.read())
+            if time.time() - entry["ts"] < ttl:
+                return entry["data"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        return None
+    
+    def set(self, key: str, data) -> None:
+        """Store data for key, stamped with the current time."""
+        path = self._path(key)
+        # Write to a per-thread temp file and rename, so readers never see a
+        # partially written entry
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(orjson.dumps({"ts": time.time(), "data": data}))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing cache entry {key}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key.replace(os.sep, '_')}.json")
 
 
 class GistStateManager:
@@ -58,7 +208,10 @@ class GistStateManager:
         gist_id (str): The GitHub Gist ID for state storage
         github_token (str): GitHub Personal Access Token with gist scope
         base_url (str): GitHub API base URL
+        url (str): Full URL of the state Gist
         headers (dict): HTTP headers for API requests
+        session (requests.Session): Keep-alive session carrying the auth headers
+        cache (FileCache): Optional store keeping the last ETag and state across runs
     
     Example:
         >>> manager = GistStateManager("gist_id", "ghp_token")
@@ -66,67 +219,119 @@ class GistStateManager:
         >>> manager.update_state({"2026-02-01": ["AAPL", "TSLA"]})
     """
     
-    def __init__(self, gist_id: str, github_token: str):
+    def __init__(self, gist_id: str, github_token: str, cache: Optional[FileCache] = None):
         self.gist_id = gist_id
+        self.cache = cache
         self.github_token = github_token
         self.base_url = "https://api.github.com/gists"
+        self.url = f"{self.base_url}/{gist_id}"
         self.headers = {
             "Authorization": f"token {github_token}",
             "Accept": "application/vnd.github.v3+json"
         }
+        # Retry transient 5xx/rate-limit responses instead of dropping the state
+        # write; PATCH replaces the file content wholesale so it is safe to repeat
+        retry = {
+            "total": 5,
+            "backoff_factor": 0.5,
+            "status_forcelist": RETRY_STATUS_CODES,
+            "allowed_methods": {"GET", "PATCH"},
+            "respect_retry_after_header": True
+        }
+        self.session = create_session(retry, pool_maxsize=4)
+        self.session.headers.update(self.headers)
+        # Last seen ETag and the state parsed from that response, used to
+        # answer a 304 Not Modified without re-downloading the Gist
+        self._etag: Optional[str] = None
+        self._cached_state: Optional[Dict[str, List[str]]] = None
+        # State filename inside the Gist, learned by get_state()
+        self._filename: Optional[str] = None
+        if cache:
+            # Resume from the previous run's response so its ETag can be revalidated
+            cached = cache.get("gist_state")
+            if isinstance(cached, dict) and cached.get("etag"):
+                self._etag = cached["etag"]
+                self._cached_state = cached.get("state") or {}
+                self._filename = cached.get("filename")
     
     def get_state(self) -> Dict[str, List[str]]:
-        """Fetch current state from Gist."""
+        """Fetch current state from Gist, using a conditional GET when possible."""
         try:
-            response = requests.get(
-                f"{self.base_url}/{self.gist_id}",
-                headers=self.headers,
+            headers = {}
+            if self._etag and self._cached_state is not None:
+                headers["If-None-Match"] = self._etag
+            response = self.session.get(
+                self.url,
+                headers=headers,
                 timeout=10
             )
+            if response.status_code == 304:
+                return self._copy_state(self._cached_state)
             response.raise_for_status()
-            gist_data = response.json()
+            gist_data = orjson.loads(response.content)
             # Get the first file's content
             files = gist_data.get("files", {})
+            self._filename = next(iter(files), "state.json")
+            state = {}
             if files:
                 file_content = list(files.values())[0].get("content", "{}")
-                return json.loads(file_content)
-            return {}
-        except Exception as e:
+                state = orjson.loads(file_content)
+            self._etag = response.headers.get("ETag")
+            self._cached_state = self._copy_state(state)
+            if self.cache and self._etag:
+                self.cache.set("gist_state", {
+                    "etag": self._etag,
+                    "state": state,
+                    "filename": self._filename
+                })
+            return state
+        except HTTP_ERRORS as e:
             print(f"Error fetching Gist state: {e}")
             return {}
     
     def update_state(self, state: Dict[str, List[str]]) -> bool:
-        """Update state in Gist."""
+        """Update state in Gist, skipping the write if nothing changed."""
+        if self._cached_state is not None and state == self._cached_state:
+            return True
         try:
-            # Get current Gist to find filename
-            response = requests.get(
-                f"{self.base_url}/{self.gist_id}",
-                headers=self.headers,
-                timeout=10
-            )
-            response.raise_for_status()
-            gist_data = response.json()
-            files = gist_data.get("files", {})
-            filename = list(files.keys())[0] if files else "state.json"
+            filename = self._filename
+            if filename is None:
+                # get_state() wasn't called first - get current Gist to find filename
+                response = self.session.get(
+                    self.url,
+                    timeout=10
+                )
+                response.raise_for_status()
+                gist_data = orjson.loads(response.content)
+                files = gist_data.get("files", {})
+                filename = list(files.keys())[0] if files else "state.json"
             
             # Update Gist
-            update_response = requests.patch(
-                f"{self.base_url}/{self.gist_id}",
-                headers=self.headers,
+            update_response = self.session.patch(
+                self.url,
                 json={
                     "files": {
                         filename: {
-                            "content": json.dumps(state, indent=2)
+                            "content": orjson.dumps(state, option=orjson.OPT_INDENT_2).decode()
                         }
                     }
                 },
                 timeout=10
             )
             update_response.raise_for_status()
+            # The Gist changed, so the cached ETag no longer matches it; keep
+            # what was written so an identical follow-up write is skipped
+            self._etag = None
+            self._cached_state = self._copy_state(state)
             return True
-        except Exception as e:
+        except HTTP_ERRORS as e:
             print(f"Error updating Gist state: {e}")
             return False
+    
+    @staticmethod
+    def _copy_state(state: Dict[str, List[str]]) -> Dict[str, List[str]]:
+        """Copy state so callers can mutate it without touching the cache."""
+        return {day: list(symbols) for day, symbols in state.items()}
 
 
 class StockDataFetcher:
@@ -140,27 +345,39 @@ class StockDataFetcher:
     Attributes:
         api_key (str): Twelve Data API key
         base_url (str): Twelve Data API base URL
+        session (requests.Session): Keep-alive session carrying the API key
+        cache (FileCache): Optional short-lived cache for quotes
     
     Example:
         >>> fetcher = StockDataFetcher("api_key")
-        >>> symbols = fetcher.get_market_movers()
+        >>> movers = fetcher.get_market_movers()
         >>> quote = fetcher.get_quote("AAPL")
+        >>> quotes = fetcher.get_quotes_batch(["AAPL", "MSFT"])
     """
     
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, cache: Optional[FileCache] = None):
         self.api_key = api_key
+        self.cache = cache
         self.base_url = "https://api.twelvedata.com"
+        self.session = create_session(API_RETRY)
+        self.session.params = {"apikey": api_key}
     
-    def get_market_movers(self) -> List[str]:
-        """Get list of top gainers from market movers endpoint or use alternative."""
+    def get_market_movers(self) -> List[Dict]:
+        """
+        Get list of top gainers from market movers endpoint or use alternative.
+        
+        Returns:
+            List of dicts with "symbol" and "percent_change". percent_change is
+            taken from the movers payload when present and is None otherwise
+            (including for the fallback list), meaning a quote is needed.
+        """
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}/market_movers/stocks",
-                params={"apikey": self.api_key},
                 timeout=10
             )
             response.raise_for_status()
-            data = response.json()
+            data = orjson.loads(response.content)
             
             # Check if endpoint requires paid plan
             if isinstance(data, dict) and data.get("status") == "error":
@@ -179,73 +396,117 @@ class StockDataFetcher:
             symbols = []
             for mover in movers:
                 if isinstance(mover, dict) and "symbol" in mover:
-                    symbols.append(mover["symbol"])
+                    symbols.append({
+                        "symbol": mover["symbol"],
+                        "percent_change": _to_float(mover.get("percent_change"))
+                    })
                 elif isinstance(mover, str):
-                    symbols.append(mover)
+                    symbols.append({"symbol": mover, "percent_change": None})
             
             return symbols[:50] if symbols else self._get_active_stocks_list()
-        except Exception as e:
+        except HTTP_ERRORS as e:
             print(f"Error fetching market movers: {e}")
             # Fallback to active stocks list
             return self._get_active_stocks_list()
     
-    def _get_active_stocks_list(self) -> List[str]:
-        """Get a list of active/popular stocks to check (fallback when market movers unavailable)."""
-        # List of popular/active stocks that are commonly traded
-        # This is a fallback when market movers endpoint requires paid plan
-        return [
-            "AAPL", "MSFT", "GOOGL", "AMZN", "NVDA", "META", "TSLA", "BRK.B",
-            "V", "JNJ", "WMT", "JPM", "MA", "PG", "UNH", "HD", "DIS",
-            "BAC", "ADBE", "NFLX", "NKE", "CMCSA", "PFE", "T", "INTC", "CSCO",
-            "XOM", "CVX", "ABBV", "COST", "AVGO", "MRK", "PEP", "TMO", "ACN",
-            "ABT", "DHR", "VZ", "ADP", "WFC", "LIN", "BMY", "PM", "NEE",
-            "RTX", "TXN", "HON", "QCOM", "AMGN", "SPGI", "LOW"
-        ]
+    def _get_active_stocks_list(self) -> List[Dict]:
+        """
+        Get a list of active/popular stocks to check (fallback when market movers unavailable).
+        
+        Returns an empty list unless CHECK_FALLBACK_LIST is enabled.
+        """
+        if not CHECK_FALLBACK_LIST:
+            print("⚠️ Market movers unavailable and CHECK_FALLBACK_LIST is disabled - no symbols to check")
+            return []
+        return [{"symbol": symbol, "percent_change": None} for symbol in _POPULAR_STOCKS]
     
     def get_quote(self, symbol: str) -> Optional[Dict[str, float]]:
         """Get quote data including previous_close and close (last_price)."""
+        if self.cache:
+            cached = self.cache.get(symbol)
+            if cached is not None:
+                return cached
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}/quote",
-                params={
-                    "symbol": symbol,
-                    "apikey": self.api_key
-                },
+                params={"symbol": symbol},
                 timeout=10
             )
             response.raise_for_status()
-            data = response.json()
-            
-            # Extract previous_close and close
-            previous_close = None
-            last_price = None
-            
-            if isinstance(data, dict):
-                previous_close = data.get("previous_close") or data.get("prev_close")
-                last_price = data.get("close") or data.get("last_price") or data.get("price")
-            
-            # Convert to float if they're strings
-            if previous_close is not None:
-                try:
-                    previous_close = float(previous_close)
-                except (ValueError, TypeError):
-                    previous_close = None
-            
-            if last_price is not None:
-                try:
-                    last_price = float(last_price)
-                except (ValueError, TypeError):
-                    last_price = None
-            
-            if previous_close and last_price and previous_close > 0:
-                return {
-                    "previous_close": previous_close,
-                    "last_price": last_price
-                }
-            return None
-        except Exception as e:
+            quote = self._parse_quote(orjson.loads(response.content))
+            if self.cache and quote:
+                self.cache.set(symbol, quote)
+            return quote
+        except HTTP_ERRORS as e:
             print(f"Error fetching quote for {symbol}: {e}")
             return None
+    
+    def get_quotes_batch(self, symbols: List[str]) -> Dict[str, Dict[str, float]]:
+        """
+        Get quote data for many symbols using comma-separated batch requests.
+        
+        Symbols are sent in chunks of QUOTE_BATCH_SIZE, so a typical run needs a
+        single request instead of one per symbol. Symbols still fresh in the
+        cache are not re-requested. Symbols without a usable quote are omitted
+        from the result.
+        """
+        quotes = {}
+        if self.cache:
+            for symbol in symbols:
+                cached = self.cache.get(symbol)
+                if cached is not None:
+                    quotes[symbol] = cached
+            symbols = [s for s in symbols if s not in quotes]
+        
+        for start in range(0, len(symbols), QUOTE_BATCH_SIZE):
+            chunk = symbols[start:start + QUOTE_BATCH_SIZE]
+            try:
+                response = self.session.get(
+                    f"{self.base_url}/quote",
+                    params={"symbol": ",".join(chunk)},
+                    timeout=10
+                )
+                response.raise_for_status()
+                data = orjson.loads(response.content)
+            except HTTP_ERRORS as e:
+                print(f"Error fetching batch quotes for {len(chunk)} symbols: {e}")
+                continue
+            
+            # A single-symbol request returns a flat quote rather than a dict keyed by symbol
+            if len(chunk) == 1:
+                data = {chunk[0]: data}
+            if not isinstance(data, dict):
+                continue
+            
+            for symbol in chunk:
+                quote = self._parse_quote(data.get(symbol))
+                if quote:
+                    quotes[symbol] = quote
+                    if self.cache:
+                        self.cache.set(symbol, quote)
+        return quotes
+    
+    @staticmethod
+    def _parse_quote(data) -> Optional[Dict[str, float]]:
+        """Extract previous_close and last_price from a single quote payload."""
+        # Extract previous_close and close
+        previous_close = None
+        last_price = None
+        
+        if isinstance(data, dict):
+            previous_close = data.get("previous_close") or data.get("prev_close")
+            last_price = data.get("close") or data.get("last_price") or data.get("price")
+        
+        # Convert to float if they're strings
+        previous_close = _to_float(previous_close)
+        last_price = _to_float(last_price)
+        
+        if previous_close and last_price and previous_close > 0:
+            return {
+                "previous_close": previous_close,
+                "last_price": last_price
+            }
+        return None
 
 
 class AnalystTargetFetcher:
@@ -258,68 +519,173 @@ class AnalystTargetFetcher:
     Attributes:
         api_key (str): Financial Modeling Prep API key
         base_url (str): FMP API base URL
+        session (requests.Session): Keep-alive session carrying the API key
+        cache (FileCache): Optional cross-run cache for targets and consensus
     
     Example:
-        >>> fetcher = AnalystTargetFetcher("api_key")
+        >>> fetcher = AnalystTargetFetcher("api_key", cache=FileCache(".cache/fmp", 86400))
         >>> targets = fetcher.get_individual_targets("AAPL")
         >>> consensus = fetcher.get_consensus_target("AAPL")
+        >>> all_consensus = fetcher.prefetch_all_consensus()
     """
     
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, cache: Optional[FileCache] = None):
         self.api_key = api_key
+        self.cache = cache
         self.base_url = "https://financialmodelingprep.com/api/v4"
+        self.session = create_session(API_RETRY)
+        self.session.params = {"apikey": api_key}
+        # Symbol -> consensus target from the bulk endpoint, filled on first use
+        self._consensus_cache: Optional[Dict[str, float]] = None
+        self._consensus_lock = threading.Lock()
+        # Per-symbol results from successful requests; analyst targets rarely
+        # change intraday, so a symbol is never fetched twice by one fetcher
+        self._targets_cache: Dict[str, List[float]] = {}
+        self._symbol_consensus_cache: Dict[str, Optional[float]] = {}
     
     def get_individual_targets(self, symbol: str) -> List[float]:
         """Get individual analyst price targets."""
+        if symbol in self._targets_cache:
+            return self._targets_cache[symbol]
+        if self.cache:
+            cached = self.cache.get(f"{symbol}_targets")
+            if cached is not None:
+                self._targets_cache[symbol] = cached
+                return cached
+            # Negative entry: FMP recently had no targets for this symbol. Never
+            # trust it longer than the cache's own TTL
+            if self.cache.get(f"{symbol}_no_targets", ttl=min(EMPTY_TARGETS_TTL, self.cache.ttl)):
+                self._targets_cache[symbol] = []
+                return []
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}/price-target",
-                params={"symbol": symbol, "apikey": self.api_key},
+                params={"symbol": symbol},
                 timeout=10
             )
             response.raise_for_status()
-            data = response.json()
+            data = orjson.loads(response.content)
             
             if isinstance(data, list):
-                targets = []
-                for entry in data:
-                    if isinstance(entry, dict):
-                        target = entry.get("target") or entry.get("priceTarget")
-                        if target:
-                            try:
-                                targets.append(float(target))
-                            except (ValueError, TypeError):
-                                continue
+                targets = [
+                    target for target in (
+                        _to_float(entry.get("target") or entry.get("priceTarget"))
+                        for entry in data if isinstance(entry, dict)
+                    )
+                    if target
+                ]
+                self._targets_cache[symbol] = targets
+                if self.cache:
+                    if targets:
+                        self.cache.set(f"{symbol}_targets", targets)
+                    else:
+                        self.cache.set(f"{symbol}_no_targets", True)
                 return targets
             return []
-        except Exception as e:
+        except HTTP_ERRORS as e:
             print(f"Error fetching individual targets for {symbol}: {e}")
             return []
     
+    def prefetch_all_consensus(self) -> Dict[str, float]:
+        """
+        Get consensus targets for all covered symbols in one bulk request.
+        
+        The result is cached on the instance, so only the first caller pays for
+        the request; concurrent callers wait for it instead of issuing their own.
+        Returns an empty dict if the bulk endpoint is unavailable. An unusable
+        response (4xx, or a body that isn't a JSON list) is also cached, so plans
+        without bulk access don't retry it every run; transient failures aren't.
+        """
+        with self._consensus_lock:
+            if self._consensus_cache is not None:
+                return self._consensus_cache
+            if self.cache:
+                cached = self.cache.get("consensus_bulk")
+                if cached:
+                    self._consensus_cache = cached
+                    return cached
+                if self.cache.get("consensus_bulk_unavailable"):
+                    self._consensus_cache = {}
+                    return self._consensus_cache
+            
+            consensus_by_symbol = {}
+            # Only a response that came back unusable marks the endpoint as
+            # unavailable; timeouts, resets and exhausted 5xx retries don't
+            unusable = False
+            try:
+                response = self.session.get(
+                    f"{self.base_url}/price-target-consensus-bulk",
+                    timeout=10
+                )
+                # 4xx other than 429: not on this plan, or the endpoint moved
+                if 400 <= response.status_code < 500 and response.status_code != 429:
+                    unusable = True
+                response.raise_for_status()
+                data = orjson.loads(response.content)
+                
+                if isinstance(data, list):
+                    for entry in data:
+                        if isinstance(entry, dict) and entry.get("symbol"):
+                            consensus = self._parse_consensus(entry)
+                            if consensus is not None:
+                                consensus_by_symbol[entry["symbol"]] = consensus
+                unusable = not consensus_by_symbol
+            except ValueError as e:
+                # Not JSON (e.g. a CSV body)
+                print(f"Error parsing bulk consensus targets: {e}")
+                unusable = True
+            except HTTP_ERRORS as e:
+                print(f"Error fetching bulk consensus targets: {e}")
+            
+            self._consensus_cache = consensus_by_symbol
+            if self.cache:
+                if consensus_by_symbol:
+                    self.cache.set("consensus_bulk", consensus_by_symbol)
+                elif unusable:
+                    self.cache.set("consensus_bulk_unavailable", True)
+            return consensus_by_symbol
+    
     def get_consensus_target(self, symbol: str) -> Optional[float]:
-        """Get consensus (mean) target."""
+        """Get consensus (mean) target, from the bulk prefetch when available."""
+        bulk_consensus = self.prefetch_all_consensus()
+        if bulk_consensus:
+            return bulk_consensus.get(symbol)
+        
+        # Bulk endpoint unavailable (e.g. plan tier) - fall back to per-symbol lookup
+        if symbol in self._symbol_consensus_cache:
+            return self._symbol_consensus_cache[symbol]
+        if self.cache:
+            cached = self.cache.get(f"{symbol}_consensus")
+            if cached is not None:
+                self._symbol_consensus_cache[symbol] = cached
+                return cached
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}/price-target-consensus",
-                params={"symbol": symbol, "apikey": self.api_key},
+                params={"symbol": symbol},
                 timeout=10
             )
             response.raise_for_status()
-            data = response.json()
+            data = orjson.loads(response.content)
             
+            consensus = None
             if isinstance(data, list) and len(data) > 0:
-                entry = data[0]
-                if isinstance(entry, dict):
-                    consensus = entry.get("targetConsensus") or entry.get("consensus") or entry.get("mean")
-                    if consensus:
-                        try:
-                            return float(consensus)
-                        except (ValueError, TypeError):
-                            pass
-            return None
-        except Exception as e:
+                consensus = self._parse_consensus(data[0])
+            self._symbol_consensus_cache[symbol] = consensus
+            if self.cache and consensus is not None:
+                self.cache.set(f"{symbol}_consensus", consensus)
+            return consensus
+        except HTTP_ERRORS as e:
             print(f"Error fetching consensus target for {symbol}: {e}")
             return None
+    
+    @staticmethod
+    def _parse_consensus(entry) -> Optional[float]:
+        """Extract the consensus target from a single consensus entry."""
+        if isinstance(entry, dict):
+            consensus = entry.get("targetConsensus") or entry.get("consensus") or entry.get("mean")
+            return _to_float(consensus) or None
+        return None
 
 
 def calculate_anchor(
@@ -331,7 +697,7 @@ def calculate_anchor(
     Calculate trimmed-and-haircut anchor price from analyst targets.
     
     Implements a robust anchor calculation algorithm:
-    1. If ≥3 targets: Sort, drop highest/lowest, calculate trimmed mean, apply haircut
+    1. If ≥3 targets: Drop highest/lowest, calculate trimmed mean, apply haircut
     2. If <3 targets: Use consensus mean, apply haircut
     3. If no targets: Return 0.0 with "none" label
     
@@ -353,10 +719,10 @@ def calculate_anchor(
         >>> method  # "trimmed"
     """
     if len(targets) >= 3:
-        # Sort and trim
-        sorted_targets = sorted(targets)
-        trimmed = sorted_targets[1:-1]  # Drop highest and lowest
-        trimmed_mean = sum(trimmed) / len(trimmed)
+        # Drop one highest and one lowest without sorting; fsum avoids the
+        # rounding error a plain sum accumulates over many targets
+        trimmed_sum = math.fsum(targets) - min(targets) - max(targets)
+        trimmed_mean = trimmed_sum / (len(targets) - 2)
         anchor = trimmed_mean * (1 - haircut_rate)
         return anchor, "trimmed"
     elif consensus_fallback is not None:
@@ -367,22 +733,44 @@ def calculate_anchor(
         return 0.0, "none"
 
 
-def check_time_window() -> bool:
+def meets_threshold(last_price: float, previous_close: float, threshold_mult: float = THRESHOLD_MULT) -> bool:
+    """
+    Check whether a move from previous_close to last_price reaches the alert threshold.
+    
+    Compares against a precomputed multiplier instead of dividing for a percentage.
+    
+    Args:
+        last_price: Current price
+        previous_close: Previous close price
+        threshold_mult: 1 + threshold percentage / 100 (defaults to THRESHOLD_MULT)
+    
+    Returns:
+        True if last_price >= previous_close * threshold_mult
+    
+    Example:
+        >>> meets_threshold(1.90, 1.00, 1.90)
+        True
+    """
+    return last_price >= previous_close * threshold_mult
+
+
+def check_time_window(pt_now: datetime) -> bool:
     """
-    Check if current time is within market hours on a weekday.
+    Check if a time is within market hours on a weekday.
     
-    Validates that the current Pacific Time is:
+    Validates that the given Pacific Time is:
     - Between 10:00 and 15:00 (10am-3pm)
     - On a weekday (Monday-Friday)
     
+    Args:
+        pt_now: Current time in Pacific Time
+    
     Returns:
         True if within market hours and weekday, False otherwise
     
     Example:
-        >>> check_time_window()  # Returns True if 10am-3pm PT on weekday
+        >>> check_time_window(datetime.now(PT_TIMEZONE))  # True if 10am-3pm PT on weekday
     """
-    pt_now = datetime.now(PT_TIMEZONE)
-    
     # Check if weekday (Monday=0, Friday=4)
     if pt_now.weekday() > 4:
         return False
@@ -392,7 +780,7 @@ def check_time_window() -> bool:
     return MARKET_OPEN_HOUR <= current_hour < MARKET_CLOSE_HOUR
 
 
-def format_discord_message(qualifying_symbols: List[Dict]) -> str:
+def format_discord_message(qualifying_symbols: List[Dict], pt_now: datetime) -> str:
     """
     Format Discord alert message with all qualifying symbols.
     
@@ -414,43 +802,140 @@ def format_discord_message(qualifying_symbols: List[Dict]) -> str:
             - anchor: Calculated anchor price
             - target_count: Number of analyst targets
             - anchor_type: Calculation method ("trimmed", "fallback", "none")
+        pt_now: Time of the run in Pacific Time, shown in the header
     
     Returns:
         Formatted message string ready for Discord
     
     Example:
         >>> symbols = [{"symbol": "ABC", "pct_change": 132.4, ...}]
-        >>> message = format_discord_message(symbols)
+        >>> message = format_discord_message(symbols, datetime.now(PT_TIMEZONE))
         >>> print(message)
         ALERT: ≥ 90% movers (10:35 PT)
         ABC +132.4% | last $2.18 | prev $0.94 | anchor (12.5%) $4.40 | targets 7 (trimmed)
     """
-    pt_now = datetime.now(PT_TIMEZONE)
     time_str = pt_now.strftime("%H:%M")
+    header = f"ALERT: ≥ {ALERT_THRESHOLD_PCT}% movers ({time_str} PT)"
+    # Same for every line, so format it once
+    hc_str = f"{HAIRCUT_RATE*100:.1f}%"
+    
+    return "\n".join(chain(
+        (header,),
+        (_format_alert_line(symbol_data, hc_str) for symbol_data in qualifying_symbols)
+    ))
+
+
+def _format_alert_line(symbol_data: Dict, hc_str: str) -> str:
+    """Format one qualifying symbol as a single alert line."""
+    anchor = symbol_data["anchor"]
+    anchor_str = f"${anchor:.2f}" if anchor > 0 else "N/A"
+    return (
+        f"{symbol_data['symbol']} +{symbol_data['pct_change']:.1f}% | "
+        f"last ${symbol_data['last_price']:.2f} | "
+        f"prev ${symbol_data['previous_close']:.2f} | "
+        f"anchor ({hc_str}) {anchor_str} | "
+        f"targets {symbol_data['target_count']} ({symbol_data['anchor_type']})"
+    )
+
+
+def split_discord_message(message: str, limit: int = DISCORD_MESSAGE_LIMIT) -> List[str]:
+    """
+    Split a message into chunks that fit Discord's message length limit.
+    
+    Splits only between lines, so each symbol's line stays intact; a single
+    line longer than the limit is cut at the limit.
     
-    lines = [f"ALERT: ≥ {ALERT_THRESHOLD_PCT}% movers ({time_str} PT)"]
-    
-    for symbol_data in qualifying_symbols:
-        symbol = symbol_data["symbol"]
-        pct_change = symbol_data["pct_change"]
-        last_price = symbol_data["last_price"]
-        previous_close = symbol_data["previous_close"]
-        anchor = symbol_data["anchor"]
-        target_count = symbol_data["target_count"]
-        anchor_type = symbol_data["anchor_type"]
-        
-        anchor_str = f"${anchor:.2f}" if anchor > 0 else "N/A"
-        target_info = f"targets {target_count} ({anchor_type})"
-        
-        lines.append(
-            f"{symbol} +{pct_change:.1f}% | "
-            f"last ${last_price:.2f} | "
-            f"prev ${previous_close:.2f} | "
-            f"anchor ({HAIRCUT_RATE*100:.1f}%) {anchor_str} | "
-            f"{target_info}"
+    Args:
+        message: Full message text
+        limit: Maximum characters per chunk
+    
+    Returns:
+        List of message chunks, in order
+    
+    Example:
+        >>> split_discord_message("header\nABC +132.4% | ...", limit=2000)
+        ['header\nABC +132.4% | ...']
+    """
+    chunks = []
+    current = ""
+    for line in message.split("\n"):
+        while len(line) > limit:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+        if not current:
+            current = line
+        elif len(current) + 1 + len(line) <= limit:
+            current += "\n" + line
+        else:
+            chunks.append(current)
+            current = line
+    if current or not chunks:
+        chunks.append(current)
+    return chunks
+
+
+def create_discord_session() -> "requests.Session":
+    """
+    Create the keep-alive session used for all Discord posts in a run.
+    
+    Carries the bot Authorization header unless posting through a webhook.
+    POST is never retried by the session (not idempotent), so a message
+    can't be duplicated.
+    """
+    session = create_session(API_RETRY)
+    if not DISCORD_WEBHOOK_URL:
+        session.headers["Authorization"] = f"Bot {DISCORD_BOT_TOKEN}"
+    return session
+
+
+def post_discord_message(session: "requests.Session", content: str) -> "requests.Response":
+    """
+    Post a message to the alert channel.
+    
+    Uses the channel webhook when DISCORD_WEBHOOK_URL is set, which needs no
+    bot authorization and has its own rate-limit bucket; otherwise falls back
+    to the bot REST API with DISCORD_BOT_TOKEN and DISCORD_CHANNEL_ID.
+    
+    Args:
+        session: Session from create_discord_session()
+        content: Message text
+    
+    Returns:
+        The Discord API response; status 200 with the created message on success
+    """
+    payload = {
+        "content": content
+    }
+    
+    if DISCORD_WEBHOOK_URL:
+        # wait=true makes Discord return the created message instead of 204
+        return session.post(
+            DISCORD_WEBHOOK_URL,
+            params={"wait": "true"},
+            json=payload,
+            timeout=10
         )
     
-    return "\n".join(lines)
+    return session.post(
+        f"https://discord.com/api/v10/channels/{DISCORD_CHANNEL_ID}/messages",
+        json=payload,
+        timeout=10
+    )
+
+
+def _print_unposted(qualifying_symbols: List[Dict], chunks: List[str], posted: int, state_saved: bool) -> None:
+    """Log which symbols never reached Discord after a failed multi-message post."""
+    # Chunks split the message between lines: one header line, then one line per symbol
+    posted_lines = sum(chunk.count("\n") + 1 for chunk in chunks[:posted])
+    unposted = [item["symbol"] for item in qualifying_symbols[max(posted_lines - 1, 0):]]
+    print(f"   Posted {posted} of {len(chunks)} messages; not posted: {', '.join(unposted)}")
+    if state_saved:
+        print("   These symbols are already saved in today's state and won't be re-alerted automatically.")
+    else:
+        print("   The state update failed too, so these symbols will be retried on the next run.")
 
 
 def main():
@@ -474,15 +959,29 @@ def main():
         0 on success or expected silent exits, 1 on critical errors
     """
     try:
+        # Single timestamp for the whole run, so the time-window check, the
+        # dedup date and the alert header can't straddle a minute boundary
+        pt_now = datetime.now(PT_TIMEZONE)
+        
+        # Check time window first - most scheduled runs fall outside market
+        # hours and should exit before doing any other work
+        if not check_time_window(pt_now):
+            print("Outside market hours or not a weekday. Exiting silently.")
+            return 0
+        
+        import requests
+        
         # Validate required environment variables
         required_vars = {
             "TWELVE_DATA_API_KEY": TWELVE_DATA_API_KEY,
             "FMP_API_KEY": FMP_API_KEY,
-            "DISCORD_BOT_TOKEN": DISCORD_BOT_TOKEN,
-            "DISCORD_CHANNEL_ID": DISCORD_CHANNEL_ID,
             "GIST_ID": GIST_ID,
             "GH_PAT": GH_PAT,
         }
+        # Bot credentials are only needed when no webhook is configured
+        if not DISCORD_WEBHOOK_URL:
+            required_vars["DISCORD_BOT_TOKEN"] = DISCORD_BOT_TOKEN
+            required_vars["DISCORD_CHANNEL_ID"] = DISCORD_CHANNEL_ID
         
         missing_vars = [var for var, value in required_vars.items() if not value]
         if missing_vars:
@@ -490,20 +989,37 @@ def main():
             print("Please ensure all required secrets are set in GitHub Actions.")
             return 1
         
-        print(f"✅ Configuration loaded: threshold={ALERT_THRESHOLD_PCT}%, haircut={HAIRCUT_RATE*100:.1f}%")
+        # Catch copy-pasted example values (e.g. "your_fmp_key") before they
+        # burn a full run of API calls with guaranteed auth failures
+        placeholder_vars = [
+            var for var, value in required_vars.items()
+            if value.strip().lower().startswith("your_")
+        ]
+        if placeholder_vars:
+            print(f"ERROR: Placeholder values in environment variables: {', '.join(placeholder_vars)}")
+            print("Replace the example values from the docs with real credentials.")
+            return 1
         
-        # Check time window
-        if not check_time_window():
-            print("Outside market hours or not a weekday. Exiting silently.")
-            return 0
+        print(f"✅ Configuration loaded: threshold={ALERT_THRESHOLD_PCT}%, haircut={HAIRCUT_RATE*100:.1f}%")
         
         # Initialize components
-        state_manager = GistStateManager(GIST_ID, GH_PAT)
-        stock_fetcher = StockDataFetcher(TWELVE_DATA_API_KEY)
-        analyst_fetcher = AnalystTargetFetcher(FMP_API_KEY)
+        state_manager = GistStateManager(
+            GIST_ID,
+            GH_PAT,
+            cache=FileCache(CACHE_DIR, GIST_CACHE_TTL)
+        )
+        stock_fetcher = StockDataFetcher(
+            TWELVE_DATA_API_KEY,
+            cache=FileCache(os.path.join(CACHE_DIR, "twelvedata"), QUOTE_CACHE_TTL)
+            if QUOTE_CACHE_TTL > 0 else None
+        )
+        analyst_fetcher = AnalystTargetFetcher(
+            FMP_API_KEY,
+            cache=FileCache(os.path.join(CACHE_DIR, "fmp"), FMP_CACHE_TTL)
+            if FMP_CACHE_TTL > 0 else None
+        )
         
         # Get today's date string
-        pt_now = datetime.now(PT_TIMEZONE)
         today_str = pt_now.strftime("%Y-%m-%d")
         
         # Load state
@@ -511,28 +1027,42 @@ def main():
         alerted_today = set(state.get(today_str, []))
         
         # Get market movers
-        symbols = stock_fetcher.get_market_movers()
+        movers = stock_fetcher.get_market_movers()
+        symbols = [mover["symbol"] for mover in movers]
+        reported_pct = {mover["symbol"]: mover["percent_change"] for mover in movers}
         if not symbols:
             print("No market movers found. Exiting silently.")
             return 0
         print(f"📊 Found {len(symbols)} market movers to check")
         print(f"   Symbols: {', '.join(symbols[:10])}{'...' if len(symbols) > 10 else ''}")
         
+        # Drop symbols already alerted today before any quote/target request
+        to_check = [symbol for symbol in symbols if symbol not in alerted_today]
+        skipped_already_alerted = len(symbols) - len(to_check)
+        
         # Process each symbol
+        passing = []
         qualifying_symbols = []
         new_alerts = []
         checked_count = 0
-        skipped_already_alerted = 0
         skipped_below_threshold = 0
         
-        for symbol in symbols:
-            # Skip if already alerted today
-            if symbol in alerted_today:
-                skipped_already_alerted += 1
+        # Movers that already report a percent change below the threshold are
+        # ruled out without a quote; the rest are confirmed against a quote
+        to_quote = []
+        for symbol in to_check:
+            pct_change = reported_pct.get(symbol)
+            if pct_change is not None and pct_change < ALERT_THRESHOLD_PCT:
+                checked_count += 1
+                skipped_below_threshold += 1
                 continue
-            
-            # Get quote data
-            quote_data = stock_fetcher.get_quote(symbol)
+            to_quote.append(symbol)
+        
+        # Fetch all quotes with batch requests instead of one request per symbol
+        quotes = stock_fetcher.get_quotes_batch(to_quote)
+        
+        for symbol in to_quote:
+            quote_data = quotes.get(symbol)
             if not quote_data:
                 continue
             
@@ -540,31 +1070,53 @@ def main():
             previous_close = quote_data["previous_close"]
             last_price = quote_data["last_price"]
             
-            # Calculate percentage change
-            pct_change = ((last_price - previous_close) / previous_close) * 100
-            
             # Check threshold
-            if pct_change < ALERT_THRESHOLD_PCT:
+            if not meets_threshold(last_price, previous_close):
                 skipped_below_threshold += 1
                 continue
             
-            # Get analyst targets
-            individual_targets = analyst_fetcher.get_individual_targets(symbol)
-            consensus_target = None
-            if len(individual_targets) < 3:
-                consensus_target = analyst_fetcher.get_consensus_target(symbol)
+            # Calculate exact percentage change for the alert
+            pct_change = ((last_price - previous_close) / previous_close) * 100
+            
+            passing.append({
+                "symbol": symbol,
+                "pct_change": pct_change,
+                "last_price": last_price,
+                "previous_close": previous_close
+            })
+        
+        # Symbols under MIN_COVERAGE_PRICE still alert, but without an anchor
+        covered = [item["symbol"] for item in passing if item["last_price"] >= MIN_COVERAGE_PRICE]
+        if len(covered) < len(passing):
+            print(f"   Skipping analyst targets for {len(passing) - len(covered)} symbols "
+                  f"under ${MIN_COVERAGE_PRICE:.2f} (no coverage expected)")
+        
+        # Fetch analyst targets for all covered symbols concurrently; the
+        # consensus call is only needed when fewer than 3 targets came back
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            target_futures = {
+                s: executor.submit(analyst_fetcher.get_individual_targets, s)
+                for s in covered
+            }
+            individual_targets = {s: f.result() for s, f in target_futures.items()}
+            consensus_futures = {
+                s: executor.submit(analyst_fetcher.get_consensus_target, s)
+                for s, targets in individual_targets.items() if len(targets) < 3
+            }
+            consensus_targets = {s: f.result() for s, f in consensus_futures.items()}
+        
+        for symbol_data in passing:
+            symbol = symbol_data["symbol"]
+            targets = individual_targets.get(symbol, [])
             
             # Calculate anchor
-            anchor, anchor_type = calculate_anchor(individual_targets, consensus_target, HAIRCUT_RATE)
+            anchor, anchor_type = calculate_anchor(targets, consensus_targets.get(symbol), HAIRCUT_RATE)
             
             # Store qualifying symbol
             qualifying_symbols.append({
-                "symbol": symbol,
-                "pct_change": pct_change,
-                "last_price": last_price,
-                "previous_close": previous_close,
+                **symbol_data,
                 "anchor": anchor,
-                "target_count": len(individual_targets),
+                "target_count": len(targets),
                 "anchor_type": anchor_type
             })
             
@@ -584,62 +1136,41 @@ def main():
         print(f"   - Below {ALERT_THRESHOLD_PCT}% threshold: {skipped_below_threshold}")
         print(f"   - Qualifying symbols: {len(qualifying_symbols)}")
         
-        # Update state
-        if today_str not in state:
-            state[today_str] = []
-        state[today_str].extend(new_alerts)
-        if not state_manager.update_state(state):
+        # Update state; runs with no new alerts already returned above, and
+        # update_state itself skips the write if nothing changed.
+        # Merge as a set so duplicates (e.g. from overlapping runs) can't accumulate
+        state[today_str] = sorted(alerted_today | set(new_alerts))
+        state_saved = state_manager.update_state(state)
+        if not state_saved:
             print("WARNING: Failed to update Gist state, but continuing with Discord post.")
         
-        # Post to Discord
-        message = format_discord_message(qualifying_symbols)
+        # Post to Discord, split into several messages if it's too long for one
+        message = format_discord_message(qualifying_symbols, pt_now)
+        
+        chunks = split_discord_message(message)
+        posted = 0
         
         try:
-            # Use Discord REST API to send message
-            headers = {
-                "Authorization": f"Bot {DISCORD_BOT_TOKEN}",
-                "Content-Type": "application/json"
-            }
-            payload = {
-                "content": message
-            }
-            response = requests.post(
-                f"https://discord.com/api/v10/channels/{DISCORD_CHANNEL_ID}/messages",
-                headers=headers,
-                json=payload,
-                timeout=10
-            )
+            message_ids = []
+            with create_discord_session() as discord_session:
+                for chunk in chunks:
+                    response = post_discord_message(discord_session, chunk)
+                    if response.status_code != 200:
+                        break
+                    message_ids.append(orjson.loads(response.content).get("id"))
+                    posted += 1
             
             # Check response status
             if response.status_code == 200:
-                data = response.json()
-                message_id = data.get("id")
                 print(f"✅ Posted alert for {len(qualifying_symbols)} symbols to Discord.")
-                print(f"   Message ID: {message_id}")
-                
-                # Verify message was actually posted by fetching it back
-                try:
-                    verify_response = requests.get(
-                        f"https://discord.com/api/v10/channels/{DISCORD_CHANNEL_ID}/messages/{message_id}",
-                        headers=headers,
-                        timeout=10
-                    )
-                    if verify_response.status_code == 200:
-                        verify_data = verify_response.json()
-                        if verify_data.get("id") == message_id:
-                            print(f"✅ Verified: Message confirmed in Discord channel")
-                        else:
-                            print(f"⚠️  WARNING: Message verification returned different ID")
-                    else:
-                        print(f"⚠️  WARNING: Could not verify message (status {verify_response.status_code})")
-                except Exception as verify_error:
-                    print(f"⚠️  WARNING: Could not verify message: {verify_error}")
-                
+                print(f"   Message ID: {', '.join(str(message_id) for message_id in message_ids)}")
                 return 0
             else:
                 # Handle specific error codes
                 error_msg = f"Discord API returned {response.status_code}"
-                if response.status_code == 401:
+                if response.status_code in (401, 404) and DISCORD_WEBHOOK_URL:
+                    error_msg += " (Invalid or deleted webhook URL)"
+                elif response.status_code == 401:
                     error_msg += " (Invalid bot token)"
                 elif response.status_code == 403:
                     error_msg += " (Bot lacks permissions)"
@@ -651,13 +1182,16 @@ def main():
                     error_msg += f": {response.text[:200]}"
                 
                 print(f"❌ ERROR: Failed to post to Discord - {error_msg}")
+                _print_unposted(qualifying_symbols, chunks, posted, state_saved)
                 return 1  # Fail the workflow for Discord errors
                 
         except requests.exceptions.Timeout:
             print(f"❌ ERROR: Discord API timeout - message may not have been sent")
+            _print_unposted(qualifying_symbols, chunks, posted, state_saved)
             return 1
         except requests.exceptions.RequestException as e:
             print(f"❌ ERROR: Discord API request failed: {e}")
+            _print_unposted(qualifying_symbols, chunks, posted, state_saved)
             return 1
         except Exception as e:
             print(f"❌ ERROR: Unexpected error posting to Discord: {e}")
@@ -3,9 +3,17 @@ Test cases for the Discord Stock Alert Bot.
 """
 
 import pytest
-from bot import calculate_anchor, check_time_window
+import orjson
+import bot
+from bot import (
+    calculate_anchor, check_time_window, format_discord_message, split_discord_message, meets_threshold,
+    ALERT_THRESHOLD_PCT, THRESHOLD_MULT,
+    AnalystTargetFetcher, FileCache, GistStateManager, StockDataFetcher
+)
 from datetime import datetime
-import pytz
+from zoneinfo import ZoneInfo
+
+PT = ZoneInfo("America/Los_Angeles")
 
 
 def test_calculate_anchor_trimmed():
@@ -82,6 +90,21 @@ def test_threshold_exact_boundary():
     assert pct_change >= 90.0 - 1e-6  # Should trigger alert
 
 
+def test_threshold_multiplier():
+    """Test the precomputed multiplier matches the configured percentage threshold."""
+    assert THRESHOLD_MULT == pytest.approx(1 + ALERT_THRESHOLD_PCT / 100, rel=1e-9)
+    # At the configured threshold: alert; just below it: no alert
+    assert meets_threshold(2.00 * THRESHOLD_MULT, 2.00)
+    assert not meets_threshold(2.00 * THRESHOLD_MULT - 0.0001, 2.00)
+
+
+def test_meets_threshold_at_90_percent():
+    """Test the $1.00 -> $1.90 boundary with an explicit 90% multiplier."""
+    assert meets_threshold(1.90, 1.00, 1.90)  # Exactly 90%: alert
+    assert not meets_threshold(1.8999, 1.00, 1.90)  # Just below: no alert
+    assert not meets_threshold(1.89, 1.00, 1.90)
+
+
 def test_threshold_just_below():
     """Test just below boundary: 89.99% gain."""
     previous_close = 1.00
@@ -110,3 +133,394 @@ def test_trimmed_mean_calculation():
     anchor, _ = calculate_anchor(targets_5, None, 0.125)
     # Trimmed: [12.0, 15.0, 18.0], mean = 15.0, anchor = 15.0 * 0.875 = 13.125
     assert anchor == pytest.approx(13.125, rel=1e-6)
+
+
+def test_trimmed_mean_drops_one_copy_of_ties():
+    """Test that tied highest/lowest targets are only dropped once each."""
+    targets = [10.0, 10.0, 15.0, 20.0, 20.0]
+    anchor, method = calculate_anchor(targets, None, 0.125)
+    # Trimmed: [10.0, 15.0, 20.0], mean = 15.0, anchor = 15.0 * 0.875 = 13.125
+    assert method == "trimmed"
+    assert anchor == pytest.approx(13.125, rel=1e-6)
+
+
+def test_check_time_window():
+    """Test market-hours window using an explicit Pacific Time timestamp."""
+    # Monday 2026-02-02
+    assert check_time_window(datetime(2026, 2, 2, 10, 0, tzinfo=PT))
+    assert check_time_window(datetime(2026, 2, 2, 14, 59, tzinfo=PT))
+    assert not check_time_window(datetime(2026, 2, 2, 9, 59, tzinfo=PT))
+    assert not check_time_window(datetime(2026, 2, 2, 15, 0, tzinfo=PT))
+    # Saturday 2026-02-07
+    assert not check_time_window(datetime(2026, 2, 7, 12, 0, tzinfo=PT))
+
+
+def test_format_discord_message_uses_given_time():
+    """Test that the alert header shows the timestamp passed in."""
+    symbols = [{
+        "symbol": "ABC",
+        "pct_change": 132.4,
+        "last_price": 2.18,
+        "previous_close": 0.94,
+        "anchor": 4.40,
+        "target_count": 7,
+        "anchor_type": "trimmed"
+    }]
+    message = format_discord_message(symbols, datetime(2026, 2, 2, 10, 35, tzinfo=PT))
+    
+    header, line = message.split("\n")
+    assert header.endswith("(10:35 PT)")
+    assert line.startswith("ABC +132.4% | last $2.18 | prev $0.94 |")
+    assert line.endswith("$4.40 | targets 7 (trimmed)")
+
+
+def test_split_discord_message():
+    """Test that long alerts are split between lines within the length limit."""
+    lines = ["ALERT: header"] + [f"SYM{i} +95.0% | details" for i in range(10)]
+    message = "\n".join(lines)
+    
+    assert split_discord_message(message) == [message]
+    
+    chunks = split_discord_message(message, limit=60)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 60 for chunk in chunks)
+    assert "\n".join(chunks).split("\n") == lines
+
+
+class StubResponse:
+    """Minimal stand-in for requests.Response."""
+    
+    def __init__(self, status_code=200, payload=None, headers=None, content=None):
+        self.status_code = status_code
+        self.content = content if content is not None else orjson.dumps(payload)
+        self.headers = headers or {}
+    
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise OSError(f"HTTP {self.status_code}")
+
+
+class StubSession:
+    """Records requests and replays queued responses in order."""
+    
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+    
+    def _respond(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        return self.responses.pop(0)
+    
+    def get(self, url, **kwargs):
+        return self._respond("GET", url, **kwargs)
+    
+    def patch(self, url, **kwargs):
+        return self._respond("PATCH", url, **kwargs)
+
+
+def _gist_response(state, etag='W/"abc"'):
+    payload = {"files": {"state.json": {"content": orjson.dumps(state).decode()}}}
+    return StubResponse(200, payload, headers={"ETag": etag})
+
+
+def test_gist_state_200_is_cached(tmp_path):
+    """Test that a full Gist response is stored with its ETag for the next run."""
+    cache = FileCache(str(tmp_path), ttl=3600)
+    manager = GistStateManager("gist", "token", cache=cache)
+    manager.session = StubSession(_gist_response({"2026-02-02": ["ABC"]}))
+    
+    assert manager.get_state() == {"2026-02-02": ["ABC"]}
+    assert manager.session.calls[0][2]["headers"] == {}
+    assert cache.get("gist_state") == {
+        "etag": 'W/"abc"',
+        "state": {"2026-02-02": ["ABC"]},
+        "filename": "state.json"
+    }
+
+
+def test_gist_state_304_uses_cached_state(tmp_path):
+    """Test that a new run revalidates the stored ETag and reuses the state on 304."""
+    cache = FileCache(str(tmp_path), ttl=3600)
+    first = GistStateManager("gist", "token", cache=cache)
+    first.session = StubSession(_gist_response({"2026-02-02": ["ABC"]}))
+    first.get_state()
+    
+    manager = GistStateManager("gist", "token", cache=cache)
+    manager.session = StubSession(StubResponse(304, content=b""))
+    state = manager.get_state()
+    
+    assert manager.session.calls[0][2]["headers"] == {"If-None-Match": 'W/"abc"'}
+    assert state == {"2026-02-02": ["ABC"]}
+    # Callers get a copy, so mutating it must not change the cached state
+    state["2026-02-02"].append("XYZ")
+    assert manager._cached_state == {"2026-02-02": ["ABC"]}
+
+
+def test_gist_update_state_skips_unchanged_state():
+    """Test that writing back the state just loaded makes no PATCH request."""
+    manager = GistStateManager("gist", "token")
+    manager.session = StubSession(
+        _gist_response({"2026-02-02": ["ABC"]}),
+        StubResponse(200, {})
+    )
+    state = manager.get_state()
+    
+    assert manager.update_state(state)
+    assert [call[0] for call in manager.session.calls] == ["GET"]
+    
+    state["2026-02-02"].append("XYZ")
+    assert manager.update_state(state)
+    assert [call[0] for call in manager.session.calls] == ["GET", "PATCH"]
+
+
+def test_get_quotes_batch_normalises_single_symbol():
+    """Test that a one-symbol request's flat quote is keyed by its symbol."""
+    fetcher = StockDataFetcher("key")
+    fetcher.session = StubSession(StubResponse(200, {"close": "1.90", "previous_close": "1.00"}))
+    
+    assert fetcher.get_quotes_batch(["ABC"]) == {
+        "ABC": {"previous_close": 1.0, "last_price": 1.9}
+    }
+    assert fetcher.session.calls[0][2]["params"] == {"symbol": "ABC"}
+
+
+def test_get_quotes_batch_drops_error_entries():
+    """Test that per-symbol errors in a batch response are left out."""
+    fetcher = StockDataFetcher("key")
+    fetcher.session = StubSession(StubResponse(200, {
+        "ABC": {"close": "2.00", "previous_close": "1.00"},
+        "BAD": {"code": 400, "message": "symbol not found", "status": "error"}
+    }))
+    
+    assert fetcher.get_quotes_batch(["ABC", "BAD", "MISSING"]) == {
+        "ABC": {"previous_close": 1.0, "last_price": 2.0}
+    }
+
+
+def test_get_quotes_batch_chunks_requests(monkeypatch):
+    """Test that symbols are sent in chunks of QUOTE_BATCH_SIZE."""
+    monkeypatch.setattr(bot, "QUOTE_BATCH_SIZE", 2)
+    quote = {"close": "2.00", "previous_close": "1.00"}
+    fetcher = StockDataFetcher("key")
+    fetcher.session = StubSession(
+        StubResponse(200, {"A": quote, "B": quote}),
+        StubResponse(500, {}),
+        StubResponse(200, quote)
+    )
+    
+    quotes = fetcher.get_quotes_batch(["A", "B", "C", "D", "E"])
+    
+    assert [call[2]["params"]["symbol"] for call in fetcher.session.calls] == ["A,B", "C,D", "E"]
+    # The failed middle chunk is skipped without losing the others
+    assert sorted(quotes) == ["A", "B", "E"]
+
+
+def test_file_cache_round_trip_and_expiry(tmp_path, monkeypatch):
+    """Test that entries are returned until they are older than the TTL."""
+    now = [1000.0]
+    monkeypatch.setattr(bot.time, "time", lambda: now[0])
+    cache = FileCache(str(tmp_path), ttl=60)
+    cache.set("AAPL_targets", [180.0, 200.0])
+    
+    now[0] += 59
+    assert cache.get("AAPL_targets") == [180.0, 200.0]
+    now[0] += 1
+    assert cache.get("AAPL_targets") is None
+
+
+def test_file_cache_ttl_override(tmp_path, monkeypatch):
+    """Test that a per-call ttl replaces the cache's default TTL."""
+    now = [1000.0]
+    monkeypatch.setattr(bot.time, "time", lambda: now[0])
+    cache = FileCache(str(tmp_path), ttl=86400)
+    cache.set("XYZ_no_targets", True)
+    
+    now[0] += 3600
+    assert cache.get("XYZ_no_targets") is True
+    assert cache.get("XYZ_no_targets", ttl=1800) is None
+
+
+def test_file_cache_missing_or_corrupt_is_a_miss(tmp_path):
+    """Test that unreadable entries read as missing instead of raising."""
+    cache = FileCache(str(tmp_path / "not_created_yet"), ttl=60)
+    assert cache.get("AAPL") is None
+    
+    cache = FileCache(str(tmp_path), ttl=60)
+    (tmp_path / "bad.json").write_bytes(b"{not json")
+    (tmp_path / "wrong_shape.json").write_bytes(b"[1, 2, 3]")
+    assert cache.get("bad") is None
+    assert cache.get("wrong_shape") is None
+
+
+def test_file_cache_failed_write_keeps_previous_entry(tmp_path, monkeypatch):
+    """Test that entries are replaced atomically and a failed write leaves no temp file."""
+    cache = FileCache(str(tmp_path), ttl=60)
+    cache.set("AAPL", {"last_price": 1.0})
+    assert [p.name for p in tmp_path.iterdir()] == ["AAPL.json"]
+    
+    def fail_replace(src, dst):
+        raise OSError("disk full")
+    
+    monkeypatch.setattr(bot.os, "replace", fail_replace)
+    cache.set("AAPL", {"last_price": 2.0})
+    
+    assert cache.get("AAPL") == {"last_price": 1.0}
+    assert [p.name for p in tmp_path.iterdir()] == ["AAPL.json"]
+
+
+def test_print_unposted_lists_symbols_from_failed_chunks(capsys):
+    """Test that a partial Discord post reports the symbols that were not sent."""
+    symbols = [{
+        "symbol": f"SYM{i}",
+        "pct_change": 95.0,
+        "last_price": 1.95,
+        "previous_close": 1.00,
+        "anchor": 0.0,
+        "target_count": 0,
+        "anchor_type": "none"
+    } for i in range(6)]
+    message = format_discord_message(symbols, datetime(2026, 2, 2, 10, 35, tzinfo=PT))
+    chunks = split_discord_message(message, limit=200)
+    assert len(chunks) > 2
+    
+    bot._print_unposted(symbols, chunks, 1, state_saved=True)
+    
+    sent = [line.split(" ", 1)[0] for line in chunks[0].split("\n")[1:]]
+    unsent = [item["symbol"] for item in symbols if item["symbol"] not in sent]
+    output = capsys.readouterr().out
+    assert f"Posted 1 of {len(chunks)} messages; not posted: {', '.join(unsent)}" in output
+    assert "already saved in today's state" in output
+    
+    # If the state write failed, the symbols weren't saved and will alert again
+    bot._print_unposted(symbols, chunks, 1, state_saved=False)
+    output = capsys.readouterr().out
+    assert "already saved" not in output
+    assert "will be retried on the next run" in output
+
+
+@pytest.mark.parametrize("response, marked", [
+    (StubResponse(503, {}), False),
+    (StubResponse(429, {}), False),
+    (StubResponse(403, {"Error Message": "Not available on your plan"}), True),
+    (StubResponse(200, content=b"symbol,targetConsensus\nAAPL,200\n"), True),
+    (StubResponse(200, {"Error Message": "Invalid request"}), True),
+])
+def test_bulk_consensus_unavailable_marker(tmp_path, response, marked):
+    """Test that only an unusable bulk response disables the endpoint across runs."""
+    cache = FileCache(str(tmp_path), ttl=3600)
+    fetcher = AnalystTargetFetcher("key", cache=cache)
+    fetcher.session = StubSession(response)
+    
+    assert fetcher.prefetch_all_consensus() == {}
+    assert (cache.get("consensus_bulk_unavailable") is True) == marked
+
+
+def test_bulk_consensus_timeout_is_not_cached(tmp_path):
+    """Test that a timeout leaves the bulk endpoint enabled for the next run."""
+    class TimeoutSession(StubSession):
+        def get(self, url, **kwargs):
+            raise OSError("Read timed out")
+    
+    cache = FileCache(str(tmp_path), ttl=3600)
+    fetcher = AnalystTargetFetcher("key", cache=cache)
+    fetcher.session = TimeoutSession()
+    
+    assert fetcher.prefetch_all_consensus() == {}
+    assert cache.get("consensus_bulk_unavailable") is None
+
+
+def test_individual_targets_served_from_cache(tmp_path):
+    """Test that cached targets are returned without a request."""
+    cache = FileCache(str(tmp_path), ttl=3600)
+    cache.set("ABC_targets", [2.0, 3.0, 4.0])
+    fetcher = AnalystTargetFetcher("key", cache=cache)
+    fetcher.session = StubSession()
+    
+    assert fetcher.get_individual_targets("ABC") == [2.0, 3.0, 4.0]
+    assert fetcher.session.calls == []
+
+
+def test_individual_targets_negative_cache(tmp_path, monkeypatch):
+    """Test that an empty FMP result is remembered only for EMPTY_TARGETS_TTL."""
+    now = [1000.0]
+    monkeypatch.setattr(bot.time, "time", lambda: now[0])
+    cache = FileCache(str(tmp_path), ttl=86400)
+    fetcher = AnalystTargetFetcher("key", cache=cache)
+    fetcher.session = StubSession(StubResponse(200, []))
+    
+    assert fetcher.get_individual_targets("XYZ") == []
+    assert cache.get("XYZ_no_targets") is True
+    assert cache.get("XYZ_targets") is None
+    
+    # A later run within EMPTY_TARGETS_TTL makes no request
+    now[0] += bot.EMPTY_TARGETS_TTL - 1
+    fetcher = AnalystTargetFetcher("key", cache=cache)
+    fetcher.session = StubSession()
+    assert fetcher.get_individual_targets("XYZ") == []
+    
+    # Past it, FMP is asked again even though the cache TTL hasn't expired
+    now[0] += 1
+    fetcher = AnalystTargetFetcher("key", cache=cache)
+    fetcher.session = StubSession(StubResponse(200, [{"priceTarget": 5.0}]))
+    assert fetcher.get_individual_targets("XYZ") == [5.0]
+    assert len(fetcher.session.calls) == 1
+
+
+def test_individual_targets_negative_cache_capped_by_cache_ttl(tmp_path, monkeypatch):
+    """Test that a cache TTL shorter than EMPTY_TARGETS_TTL also limits the marker."""
+    now = [1000.0]
+    monkeypatch.setattr(bot.time, "time", lambda: now[0])
+    cache = FileCache(str(tmp_path), ttl=60)
+    cache.set("XYZ_no_targets", True)
+    
+    now[0] += 60
+    fetcher = AnalystTargetFetcher("key", cache=cache)
+    fetcher.session = StubSession(StubResponse(200, []))
+    assert fetcher.get_individual_targets("XYZ") == []
+    assert len(fetcher.session.calls) == 1
+
+
+def test_individual_targets_failure_not_cached(tmp_path):
+    """Test that a failed request doesn't write the no-targets marker."""
+    cache = FileCache(str(tmp_path), ttl=3600)
+    fetcher = AnalystTargetFetcher("key", cache=cache)
+    fetcher.session = StubSession(StubResponse(503, {}))
+    
+    assert fetcher.get_individual_targets("XYZ") == []
+    assert cache.get("XYZ_no_targets") is None
+
+
+def test_consensus_target_uses_bulk_map(tmp_path):
+    """Test that consensus lookups after one bulk request need no per-symbol calls."""
+    fetcher = AnalystTargetFetcher("key", cache=FileCache(str(tmp_path), ttl=3600))
+    fetcher.session = StubSession(StubResponse(200, [
+        {"symbol": "ABC", "targetConsensus": 4.5},
+        {"symbol": "DEF", "targetConsensus": "7.25"}
+    ]))
+    
+    assert fetcher.get_consensus_target("ABC") == 4.5
+    assert fetcher.get_consensus_target("DEF") == 7.25
+    assert fetcher.get_consensus_target("NONE") is None
+    assert len(fetcher.session.calls) == 1
+    assert fetcher.session.calls[0][1].endswith("/price-target-consensus-bulk")
+
+
+def test_consensus_target_falls_back_after_bulk_failure(tmp_path):
+    """Test per-symbol fallback when bulk fails, and that a 5xx doesn't disable bulk next run."""
+    cache = FileCache(str(tmp_path), ttl=3600)
+    fetcher = AnalystTargetFetcher("key", cache=cache)
+    fetcher.session = StubSession(
+        StubResponse(503, {}),
+        StubResponse(200, [{"symbol": "ABC", "targetConsensus": 4.5}])
+    )
+    
+    assert fetcher.get_consensus_target("ABC") == 4.5
+    assert [call[1].rsplit("/", 1)[1] for call in fetcher.session.calls] == [
+        "price-target-consensus-bulk", "price-target-consensus"
+    ]
+    
+    # Next run tries the bulk endpoint again
+    fetcher = AnalystTargetFetcher("key", cache=cache)
+    fetcher.session = StubSession(StubResponse(200, [{"symbol": "DEF", "targetConsensus": 7.0}]))
+    assert fetcher.get_consensus_target("DEF") == 7.0
+    assert fetcher.session.calls[0][1].endswith("/price-target-consensus-bulk")